@@ -0,0 +1,181 @@
+import time
+
+import pytest
+
+pytest.importorskip("typer")
+
+import translate_notebooks as tn
+
+
+def test_is_trivial_markdown_fence_only():
+    assert tn.is_trivial_markdown("  \n")
+    assert tn.is_trivial_markdown("```python\nx = 1\n```\n\n```bash\nls\n```")
+    assert not tn.is_trivial_markdown("Text\n```\nx\n```")
+    assert not tn.is_trivial_markdown("```\nunterminated")
+
+
+def test_is_trivial_markdown_many_fences_then_prose_is_fast():
+    text = "```python\nimport numpy as np\n```\n\n" * 200 + "Some prose to translate."
+    start = time.perf_counter()
+    assert not tn.is_trivial_markdown(text)
+    assert time.perf_counter() - start < 1.0
+
+
+class _FailingFirstCellTranslator(tn.TranslatorInterface):
+    def __init__(self):
+        self.calls = 0
+
+    def translate(self, text, target_lang='ja'):
+        self.calls += 1
+        return None if text.startswith("fail") else "JA:" + text
+
+
+def test_source_hash_not_written_when_a_cell_failed(tmp_path):
+    notebook = {"cells": [
+        {"cell_type": "markdown", "source": ["fail me"]},
+        {"cell_type": "markdown", "source": ["translate me"]},
+    ]}
+    (tmp_path / "n.ipynb").write_text(tn.json.dumps(notebook), encoding="utf-8")
+
+    translator = _FailingFirstCellTranslator()
+    tn.translate_notebooks_in_directory(str(tmp_path), translator, workers=1)
+    assert (tmp_path / "jp_n.ipynb").exists()
+    assert not (tmp_path / ("jp_n.ipynb" + tn.SOURCE_HASH_SUFFIX)).exists()
+
+    calls = translator.calls
+    tn.translate_notebooks_in_directory(str(tmp_path), translator, workers=1)
+    assert translator.calls > calls
+
+
+class _IdentityTranslator(tn.TranslatorInterface):
+    def __init__(self):
+        self.calls = 0
+
+    def translate(self, text, target_lang='ja'):
+        self.calls += 1
+        return text if text == "---" else "JA:" + text
+
+
+def test_source_hash_written_when_a_cell_is_unchanged_on_purpose(tmp_path):
+    notebook = {"cells": [
+        {"cell_type": "markdown", "source": ["---"]},
+        {"cell_type": "markdown", "source": ["translate me"]},
+    ]}
+    (tmp_path / "n.ipynb").write_text(tn.json.dumps(notebook), encoding="utf-8")
+
+    translator = _IdentityTranslator()
+    tn.translate_notebooks_in_directory(str(tmp_path), translator, workers=1)
+    assert (tmp_path / ("jp_n.ipynb" + tn.SOURCE_HASH_SUFFIX)).exists()
+
+    calls = translator.calls
+    tn.translate_notebooks_in_directory(str(tmp_path), translator, workers=1)
+    assert translator.calls == calls
+
+
+def test_cached_translator_stores_unchanged_results_but_not_failures(tmp_path):
+    cache = tn.TranslationCache(str(tmp_path / "cache.sqlite"))
+    engine = _IdentityTranslator()
+    translator = tn.CachedTranslator(engine, cache, "identity")
+    try:
+        assert translator.translate_batch(["---", "text"]) == ["---", "JA:text"]
+        assert translator.translate_batch(["---", "text"]) == ["---", "JA:text"]
+        assert engine.calls == 2
+
+        failing = tn.CachedTranslator(_FailingFirstCellTranslator(), cache, "failing")
+        assert failing.translate("fail me") is None
+        assert failing.translate("fail me") is None
+        assert failing.translator.calls == 2
+    finally:
+        cache.close()
+
+
+def test_protect_markdown_leaves_prices_translatable():
+    text = "It costs $5 and $10 per month, see $a+b$."
+    protected_text, protected = tn.protect_markdown(text)
+    assert protected == ("$a+b$",)
+    assert "costs $5 and $10 per month" in protected_text
+
+
+class _MarkerTranslator(tn.TranslatorInterface):
+    def translate(self, text, target_lang='ja'):
+        return 'JA "q" \\ ' + text
+
+
+def _translate_code(source):
+    return tn.translate_code_cell_source(source, _MarkerTranslator())
+
+
+def test_code_literals_are_spliced_and_reescaped():
+    source = [
+        "a = u'a unicode string that is long enough'\n",
+        "b = 'short'\n",
+        'c = """a triple quoted string\nwith "quotes" inside"""\n',
+        "d = r'a raw string that is long enough'\n",
+    ]
+    new_source, changed, complete = _translate_code(source)
+    assert changed and complete
+    assert new_source[0].startswith("a = u'")
+    assert new_source[1] == "b = 'short'\n"
+    assert new_source[-1] == "d = r'a raw string that is long enough'\n"
+
+    namespace = {}
+    exec("".join(new_source), namespace)
+    assert namespace["a"] == 'JA "q" \\ a unicode string that is long enough'
+    assert namespace["c"] == 'JA "q" \\ a triple quoted string\nwith "quotes" inside'
+
+
+def test_code_literals_keep_crlf_line_endings():
+    source = ['x = "a long string on a crlf line"\r\n', 'y = """multi line\r\nstring long enough"""\r\n']
+    new_source, changed, _ = _translate_code(source)
+    assert changed
+    assert all(line.endswith("\r\n") for line in new_source)
+    namespace = {}
+    exec("".join(new_source), namespace)
+    assert namespace["y"] == 'JA "q" \\ multi line\nstring long enough'
+
+
+def test_code_literals_in_magic_lines_are_not_translated():
+    source = ['%pip install "a long package spec here"\n', '!echo "a long shell argument here"\n']
+    assert _translate_code(source) == (source, False, True)
+    cell_magic = ['%%bash\n', 'echo "a long shell argument here"\n']
+    assert _translate_code(cell_magic) == (cell_magic, False, True)
+
+    mixed = ['%matplotlib inline\n', 'print("a long message to translate")\n']
+    new_source, changed, _ = _translate_code(mixed)
+    assert changed
+    assert new_source[0] == '%matplotlib inline\n'
+
+
+def test_protect_restore_round_trip():
+    text = (
+        "Use `np.array` with $x^2$ and $$\\int f(x) dx$$.\n"
+        "See [the docs](https://numpy.org) and ![plot](plot.png).\n"
+        "```python\nimport numpy as np\n```\n"
+    )
+    protected_text, protected = tn.protect_markdown(text)
+    assert protected == (
+        "`np.array`", "$x^2$", "$$\\int f(x) dx$$", "[the docs](https://numpy.org)",
+        "![plot](plot.png)", "```python\nimport numpy as np\n```",
+    )
+    assert "numpy.org" not in protected_text
+    assert tn.restore_markdown(protected_text, protected) == text
+    # 翻訳エンジンがプレースホルダーの前後に空白を入れても復元できる
+    spaced = protected_text.replace("\uE000", "\uE000 ").replace("\uE001", " \uE001")
+    assert tn.restore_markdown(spaced, protected) == text
+
+
+def test_restore_markdown_returns_none_when_a_placeholder_is_lost():
+    protected_text, protected = tn.protect_markdown("Call `f()` then `g()`.")
+    lost = protected_text.replace("1", "")
+    assert tn.restore_markdown(lost, protected) is None
+
+
+def test_lost_placeholder_keeps_original_cell(tmp_path):
+    class _DroppingTranslator(tn.TranslatorInterface):
+        def translate(self, text, target_lang='ja'):
+            return tn.PLACEHOLDER_RE.sub("", text)
+
+    notebook = {"cells": [{"cell_type": "markdown", "source": ["Run `make` first."]}]}
+    (tmp_path / "n.ipynb").write_text(tn.json.dumps(notebook), encoding="utf-8")
+    tn.translate_notebook_cells(str(tmp_path / "n.ipynb"), _DroppingTranslator())
+    assert not (tmp_path / "jp_n.ipynb").exists()
@@ -7,21 +7,30 @@ Jupyter Notebook Markdownセル・コードセル 自動翻訳スクリプト
 ディレクトリ内のJupyter Notebook（.ipynb）ファイルのMarkdownセルを自動で日本語に翻訳し、
 新たに翻訳済みファイル（jp_ファイル名.ipynb）を作成します。
 
-翻訳エンジンは、以下の2種類から選択可能です:
+翻訳エンジンは、以下の3種類から選択可能です:
 - googletrans (非公式Google翻訳APIライブラリ)
 - Google Cloud Translation API (公式)
+- Google Cloud Translation API (公式, httpx による非同期・HTTP/2 での並行リクエスト)
 
 【主な機能】
 - ディレクトリ内の.ipynbファイルを一括処理
 - Markdownセルを日本語に翻訳
 - オプションで、コードセル内の文字列リテラル（20文字以上）も翻訳
 - 翻訳エンジンを柔軟に切り替え可能（--engine オプション）
+- 複数ファイルをスレッドで並列に翻訳（--workers オプション）
+- 翻訳結果をディスクにキャッシュし、変更のないセルは再翻訳しない（--no-cache で無効化）
+- 前回の実行から原文が変わっていないNotebookはスキップ（出力横の .srchash ファイルで判定）
+- 出力は既定でインデントなしのJSON（--pretty でインデント付き、--gzip で .ipynb.gz に圧縮）
 - Typer を用いたモダンなCLI
 
 【使い方】
 --------------------------------------------------
 1. 必要なライブラリをインストール
    pip install googletrans==4.0.0-rc1 google-cloud-translate==3.11.2 typer[all]
+   # Notebookの読み書きを高速化する場合は（任意）
+   pip install orjson
+   # gcloud-async を使う場合は追加で
+   pip install httpx[http2]
 
 2. Google Cloud Translation API を利用する場合は、サービスアカウントの認証情報を使用してください。
    サービスアカウントキーのJSONファイルを取得し、環境変数 GOOGLE_APPLICATION_CREDENTIALS にそのファイルパスを設定します。
@@ -33,171 +42,860 @@ Jupyter Notebook Markdownセル・コードセル 自動翻訳スクリプト
 
    # gcloud を使い、コードセル内の文字列リテラルも翻訳する場合
    python translate_notebooks.py --directory /path/to/notebook-directory --engine gcloud --translate-code
+
+   # 大きなNotebookのセルを並行に翻訳する場合
+   python translate_notebooks.py --directory /path/to/notebook-directory --engine gcloud-async
 --------------------------------------------------
 """
 
 import os
+import io
+import ast
+import asyncio
 import json
+import gzip
+import mmap
 import time
+import random
 import logging
 import re
-from typing import Optional
+import token
+import tokenize
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Awaitable, Callable, Iterator, Optional, TypeVar
 from abc import ABC, abstractmethod
 import typer
 
+try:
+    import orjson
+except ImportError:  # orjson が無い環境では標準の json で読み書きする
+    orjson = None
+
 # ----------------------------------------
 # ログ設定
 # ----------------------------------------
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 logger = logging.getLogger(__name__)
 
+# Cloud Translation API v2 の1リクエストあたりの上限（文字数は余裕を持たせた値）
+MAX_BATCH_CHARS = 25000
+MAX_SEGMENTS = 128
+
+# 翻訳済みファイルの接頭辞（ディレクトリ処理時はこれらで始まるファイルを再翻訳しない）
+OUTPUT_PREFIX = 'jp_'
+TRANSLATED_PREFIXES = ('translated_', OUTPUT_PREFIX)
+
+# ----------------------------------------
+# リトライ（指数バックオフ＋ジッター）
+# ----------------------------------------
+# 再送しても成功しないHTTPステータス（リクエスト不正・権限なし・存在しない）
+NON_RETRYABLE_STATUS = {400, 403, 404}
+MAX_BACKOFF = 60.0
+
+T = TypeVar('T')
+
+def _status_code(error: Exception) -> Optional[int]:
+    """httpx.HTTPStatusError や google.api_core の例外から HTTP ステータスを取り出す"""
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is None:
+        status = getattr(error, 'code', None)
+    return status if isinstance(status, int) else None
+
+def is_retryable_error(error: Exception) -> bool:
+    return _status_code(error) not in NON_RETRYABLE_STATUS
+
+def backoff_delay(attempt: int, base: float = 0.5) -> float:
+    """attempt 回目の失敗後の待ち時間（指数バックオフ＋ジッター）"""
+    return min(MAX_BACKOFF, base * 2 ** (attempt - 1)) + random.random() * 0.25
+
+def call_with_retries(func: Callable[[], T], retries: int, delay: float, label: str) -> T:
+    """func を最大 retries 回呼び出す。再送不可のエラーや最後の失敗は呼び出し元に送出する"""
+    for attempt in range(1, retries + 1):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == retries or not is_retryable_error(e):
+                raise
+            wait = backoff_delay(attempt, delay)
+            logger.warning(f"[{label}] Attempt {attempt}/{retries} failed: {e} (retrying in {wait:.1f}s)")
+            time.sleep(wait)
+    raise ValueError("retries must be at least 1")
+
+async def call_with_retries_async(func: Callable[[], Awaitable[T]], retries: int, delay: float, label: str) -> T:
+    """call_with_retries の非同期版"""
+    for attempt in range(1, retries + 1):
+        try:
+            return await func()
+        except Exception as e:
+            if attempt == retries or not is_retryable_error(e):
+                raise
+            wait = backoff_delay(attempt, delay)
+            logger.warning(f"[{label}] Attempt {attempt}/{retries} failed: {e} (retrying in {wait:.1f}s)")
+            await asyncio.sleep(wait)
+    raise ValueError("retries must be at least 1")
+
 # ----------------------------------------
 # 翻訳エンジンインターフェース
 # ----------------------------------------
 class TranslatorInterface(ABC):
+    # translate_batch が1回の呼び出しで複数テキストをまとめて（または並行に）翻訳できるかどうか
+    supports_batch = False
+
     @abstractmethod
-    def translate(self, text: str, target_lang: str = 'ja') -> str:
-        """テキストを指定言語に翻訳する"""
+    def translate(self, text: str, target_lang: str = 'ja') -> Optional[str]:
+        """
+        テキストを指定言語に翻訳する。翻訳に失敗した場合は None を返す
+        （訳文が原文と同じになるのは正常な結果なので、失敗とは区別する）。
+        空白のみのテキストは呼び出し側で除外するため、text は空でないものとしてよい。
+        """
+        pass
+
+    def translate_batch(self, texts: list[str], target_lang: str = 'ja') -> list[Optional[str]]:
+        """複数のテキストをまとめて翻訳する（既定では1件ずつ translate を呼ぶ）。失敗した要素は None"""
+        return [self.translate(text, target_lang) for text in texts]
+
+    def close(self) -> None:
+        """実行全体で共有していた接続などを解放する"""
         pass
 
 # ----------------------------------------
 # googletrans 実装
 # ----------------------------------------
 class GoogletransTranslator(TranslatorInterface):
-    def __init__(self, retries: int = 3, delay: int = 2):
+    def __init__(self, retries: int = 3, delay: float = 0.5):
         from googletrans import Translator
-        self.translator = Translator()
+        self._translator_cls = Translator
+        # googletrans 内部の httpx クライアントはスレッド間で共有できないため、スレッドごとに生成する
+        self._local = threading.local()
         self.retries = retries
         self.delay = delay
 
-    def translate(self, text: str, target_lang: str = 'ja') -> str:
-        if not text.strip():
-            return text
+    @property
+    def translator(self):
+        if not hasattr(self._local, 'translator'):
+            self._local.translator = self._translator_cls()
+        return self._local.translator
 
-        for attempt in range(1, self.retries + 1):
-            try:
-                result = self.translator.translate(text, dest=target_lang)
-                if result and result.text:
-                    logger.debug(f"[googletrans] Success on attempt {attempt}")
-                    return result.text
-            except Exception as e:
-                logger.warning(f"[googletrans] Attempt {attempt}/{self.retries} failed: {e}")
-                time.sleep(self.delay)
-        logger.error("[googletrans] Translation failed after retries")
-        return text
+    def translate(self, text: str, target_lang: str = 'ja') -> Optional[str]:
+        def call() -> str:
+            result = self.translator.translate(text, dest=target_lang)
+            if not (result and result.text):
+                raise RuntimeError("Empty translation result")
+            return result.text
+
+        try:
+            translated = call_with_retries(call, self.retries, self.delay, 'googletrans')
+            logger.debug("[googletrans] Translation success")
+            return translated
+        except Exception as e:
+            logger.error(f"[googletrans] Translation failed: {e}")
+            return None
 
 # ----------------------------------------
 # Google Cloud Translation API 実装 (using service account credentials)
 # ----------------------------------------
+def _check_gcloud_credentials() -> None:
+    # Check for service account credentials
+    credentials_path = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
+    if not credentials_path:
+        logger.error("Environment variable 'GOOGLE_APPLICATION_CREDENTIALS' is not set. "
+                     "Please set it to the path of your service account JSON file.")
+        raise EnvironmentError("GOOGLE_APPLICATION_CREDENTIALS not set. "
+                               "See https://cloud.google.com/docs/authentication/getting-started for more details.")
+
 class GoogleCloudTranslator(TranslatorInterface):
-    def __init__(self):
+    supports_batch = True
+
+    def __init__(self, retries: int = 3, delay: float = 0.5):
         from google.cloud import translate_v2 as translate
-        # Check for service account credentials
-        credentials_path = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
-        if not credentials_path:
-            logger.error("Environment variable 'GOOGLE_APPLICATION_CREDENTIALS' is not set. "
-                         "Please set it to the path of your service account JSON file.")
-            raise EnvironmentError("GOOGLE_APPLICATION_CREDENTIALS not set. "
-                                   "See https://cloud.google.com/docs/authentication/getting-started for more details.")
-        self.client = translate.Client()
-
-    def translate(self, text: str, target_lang: str = 'ja') -> str:
-        if not text.strip():
-            return text
+        _check_gcloud_credentials()
+        self._client_cls = translate.Client
+        # クライアントが内部で使う HTTP セッションはスレッドセーフでないため、スレッドごとに生成する
+        self._local = threading.local()
+        self.retries = retries
+        self.delay = delay
+
+    @property
+    def client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self._client_cls()
+        return self._local.client
+
+    def translate(self, text: str, target_lang: str = 'ja') -> Optional[str]:
         try:
-            result = self.client.translate(text, target_language=target_lang)
+            result = call_with_retries(lambda: self.client.translate(text, target_language=target_lang, format_='text'),
+                                       self.retries, self.delay, 'gcloud')
             logger.debug("[gcloud] Translation success")
             return result['translatedText']
         except Exception as e:
             logger.error(f"[gcloud] Translation failed: {e}")
-            return text
+            return None
+
+    def translate_batch(self, texts: list[str], target_lang: str = 'ja') -> list[Optional[str]]:
+        # v2 API はリストを受け取り、1回のリクエストで全件を翻訳できる
+        try:
+            results = call_with_retries(lambda: self.client.translate(texts, target_language=target_lang, format_='text'),
+                                        self.retries, self.delay, 'gcloud')
+            logger.debug(f"[gcloud] Batch translation success ({len(texts)} segments)")
+            return [result['translatedText'] for result in results]
+        except Exception as e:
+            logger.error(f"[gcloud] Batch translation failed: {e}")
+            return [None] * len(texts)
+
+# ----------------------------------------
+# 非同期翻訳エンジンインターフェース
+# ----------------------------------------
+class AsyncTranslatorInterface(TranslatorInterface):
+    """
+    httpx.AsyncClient を用いる非同期翻訳エンジン。
+    実行全体で1つのイベントループ（専用スレッド）とクライアントを共有し、
+    translate_batch ではその上で各テキストを並行に翻訳する。
+    """
+    supports_batch = True
+    max_concurrency = 16
+    retries = 3
+    delay = 0.5
+
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _loop_lock = threading.Lock()
+
+    @abstractmethod
+    def create_client(self):
+        """翻訳リクエストに使う httpx.AsyncClient を生成する"""
+        pass
+
+    @abstractmethod
+    async def translate_async(self, client, text: str, target_lang: str = 'ja') -> str:
+        """テキストを指定言語に非同期で翻訳する"""
+        pass
+
+    def translate(self, text: str, target_lang: str = 'ja') -> Optional[str]:
+        return self.translate_batch([text], target_lang)[0]
+
+    def translate_batch(self, texts: list[str], target_lang: str = 'ja') -> list[Optional[str]]:
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self._translate_all(texts, target_lang), loop).result()
+
+    def close(self) -> None:
+        with self._loop_lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join()
+            self._loop.close()
+            self._loop = None
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        # 初回呼び出し時にイベントループ用スレッドを起動し、クライアントを1度だけ生成する
+        # （ファイルごとに接続・TLSハンドシェイクをやり直さないため）
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='translator-event-loop', daemon=True)
+                thread.start()
+                try:
+                    self._client, self._semaphore = asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+                except BaseException:
+                    # クライアントを生成できなかった場合（h2 が未インストールなど）はスレッドを残さない
+                    loop.call_soon_threadsafe(loop.stop)
+                    thread.join()
+                    loop.close()
+                    raise
+                self._loop, self._loop_thread = loop, thread
+            return self._loop
+
+    async def _open(self):
+        # 同時リクエスト数を全ワーカーで共有して制限し、API の QPS 上限を超えないようにする
+        return self.create_client(), asyncio.Semaphore(self.max_concurrency)
+
+    async def _translate_all(self, texts: list[str], target_lang: str) -> list[Optional[str]]:
+        async def translate_one(text: str) -> str:
+            async with self._semaphore:
+                return await call_with_retries_async(lambda: self.translate_async(self._client, text, target_lang),
+                                                     self.retries, self.delay, 'async')
+
+        results = await asyncio.gather(*[translate_one(text) for text in texts], return_exceptions=True)
+
+        translated: list[Optional[str]] = []
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error(f"[async] Translation failed: {result}")
+                translated.append(None)
+            else:
+                translated.append(result)
+        return translated
+
+# ----------------------------------------
+# Google Cloud Translation API 非同期実装 (REST API を httpx で直接呼び出す)
+# ----------------------------------------
+GCLOUD_TRANSLATE_URL = 'https://translation.googleapis.com/language/translate/v2'
+GCLOUD_TRANSLATE_SCOPE = 'https://www.googleapis.com/auth/cloud-translation'
+
+class AsyncGoogleCloudTranslator(AsyncTranslatorInterface):
+    def __init__(self, max_connections: int = 32):
+        import httpx
+        import google.auth
+        from google.auth.transport.requests import Request
+        _check_gcloud_credentials()
+        self._httpx = httpx
+        self.limits = httpx.Limits(max_connections=max_connections)
+        self.credentials, _ = google.auth.default(scopes=[GCLOUD_TRANSLATE_SCOPE])
+        self._auth_request = Request()
+        self._auth_lock = threading.Lock()
+
+    def _access_token(self) -> str:
+        # アクセストークンは期限切れの場合のみ更新する
+        with self._auth_lock:
+            if not self.credentials.valid:
+                self.credentials.refresh(self._auth_request)
+            return self.credentials.token
+
+    def create_client(self):
+        return self._httpx.AsyncClient(http2=True, limits=self.limits, timeout=30.0)
+
+    async def _bearer_token(self) -> str:
+        # トークンの更新は同期の HTTP リクエストなので、イベントループを止めないよう別スレッドで行う
+        if not self.credentials.valid:
+            return await asyncio.get_running_loop().run_in_executor(None, self._access_token)
+        return self.credentials.token
+
+    async def translate_async(self, client, text: str, target_lang: str = 'ja') -> str:
+        response = await client.post(
+            GCLOUD_TRANSLATE_URL,
+            # 既定の format は html で、訳文が HTML エスケープされ空白も崩れるため text を指定する
+            json={'q': text, 'target': target_lang, 'format': 'text'},
+            headers={'Authorization': f"Bearer {await self._bearer_token()}"},
+        )
+        response.raise_for_status()
+        logger.debug("[gcloud-async] Translation success")
+        return response.json()['data']['translations'][0]['translatedText']
+
+# ----------------------------------------
+# 翻訳キャッシュ（SQLite に永続化）
+# ----------------------------------------
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'translate_notebooks', 'cache.sqlite')
+
+class TranslationCache:
+    """(原文, 翻訳先言語, 翻訳エンジン) のハッシュをキーに翻訳結果を保存する"""
+    def __init__(self, path: str = CACHE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 複数のワーカースレッドから使うため、接続はロックで保護して共有する
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS translations (key BLOB PRIMARY KEY, value TEXT)')
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(text: str, target_lang: str, engine_name: str) -> bytes:
+        data = text.encode() + b"|" + target_lang.encode() + b"|" + engine_name.encode()
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def get_many(self, keys: list[bytes]) -> dict[bytes, str]:
+        found: dict[bytes, str] = {}
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute('SELECT value FROM translations WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    found[key] = row[0]
+        return found
+
+    def set_many(self, items: dict[bytes, str]) -> None:
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany('INSERT OR REPLACE INTO translations (key, value) VALUES (?, ?)', items.items())
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class CachedTranslator(TranslatorInterface):
+    """キャッシュに無いテキストだけを下位の翻訳エンジンに渡すラッパー"""
+    def __init__(self, translator: TranslatorInterface, cache: TranslationCache, engine_name: str):
+        self.translator = translator
+        self.cache = cache
+        self.engine_name = engine_name
+
+    @property
+    def supports_batch(self) -> bool:
+        return self.translator.supports_batch
+
+    def translate(self, text: str, target_lang: str = 'ja') -> Optional[str]:
+        return self.translate_batch([text], target_lang)[0]
+
+    def translate_batch(self, texts: list[str], target_lang: str = 'ja') -> list[Optional[str]]:
+        keys = [TranslationCache.make_key(text, target_lang, self.engine_name) for text in texts]
+        cached = self.cache.get_many(keys)
+        results = [cached.get(key) for key in keys]
+        misses = [i for i, key in enumerate(keys) if key not in cached]
+        if misses:
+            logger.debug(f"[cache] {len(texts) - len(misses)} hits, {len(misses)} misses")
+            translated = self.translator.translate_batch([texts[i] for i in misses], target_lang)
+            new_items: dict[bytes, str] = {}
+            for i, translated_text in zip(misses, translated):
+                results[i] = translated_text
+                # 翻訳に失敗した要素（None）はキャッシュに保存しない
+                if translated_text is not None:
+                    new_items[keys[i]] = translated_text
+            self.cache.set_many(new_items)
+        return results
+
+    def close(self) -> None:
+        self.translator.close()
+
+class LookupTranslator(TranslatorInterface):
+    """翻訳済みの辞書から結果を返し、辞書に無いテキストだけを下位の翻訳エンジンに渡すラッパー"""
+    def __init__(self, translations: dict[str, Optional[str]], translator: TranslatorInterface):
+        self.translations = translations
+        self.translator = translator
+
+    @property
+    def supports_batch(self) -> bool:
+        return self.translator.supports_batch
+
+    def translate(self, text: str, target_lang: str = 'ja') -> Optional[str]:
+        return self.translate_batch([text], target_lang)[0]
+
+    def translate_batch(self, texts: list[str], target_lang: str = 'ja') -> list[Optional[str]]:
+        misses = [text for text in texts if text not in self.translations]
+        if misses:
+            self.translations.update(zip(misses, self.translator.translate_batch(misses, target_lang)))
+        return [self.translations[text] for text in texts]
 
 # get_translator returns a TranslatorInterface based on the engine string
-def get_translator(engine: str) -> TranslatorInterface:
+def get_translator(engine: str, cache: Optional[TranslationCache] = None) -> TranslatorInterface:
     if engine == 'googletrans':
-        return GoogletransTranslator()
+        translator = GoogletransTranslator()
     elif engine == 'gcloud':
-        return GoogleCloudTranslator()
+        translator = GoogleCloudTranslator()
+    elif engine == 'gcloud-async':
+        translator = AsyncGoogleCloudTranslator()
     else:
         raise ValueError(f"Unsupported engine: {engine}")
+    if cache is not None:
+        return CachedTranslator(translator, cache, engine)
+    return translator
+
+# ----------------------------------------
+# バッチ翻訳（APIの上限に合わせてチャンク分割）
+# ----------------------------------------
+def chunk_texts(texts: list[str], max_chars: int = MAX_BATCH_CHARS, max_segments: int = MAX_SEGMENTS) -> Iterator[list[str]]:
+    """
+    テキストのリストを、1リクエストの文字数・セグメント数の上限を超えないチャンクに分割する。
+    単独で上限を超えるテキストはそれだけで1チャンクとする。
+    """
+    chunk: list[str] = []
+    chunk_chars = 0
+    for text in texts:
+        if chunk and (len(chunk) >= max_segments or chunk_chars + len(text) > max_chars):
+            yield chunk
+            chunk = []
+            chunk_chars = 0
+        chunk.append(text)
+        chunk_chars += len(text)
+    if chunk:
+        yield chunk
+
+# コードフェンス（```...```）。入れ子の繰り返しにすると後ろに本文がある場合に
+# 指数的なバックトラックが起きるため、フェンスを取り除いてから残りを調べる
+CODE_FENCE_RE = re.compile(r"```[^\n]*\n.*?```", re.DOTALL)
+
+def is_trivial_markdown(text: str) -> bool:
+    """翻訳する必要のない（空白のみ・コードフェンスのみの）Markdownかどうか"""
+    return not text.strip() or not CODE_FENCE_RE.sub("", text).strip()
 
 # ----------------------------------------
-# コードセル内の文字列リテラル翻訳（正規表現ベース）
+# 翻訳不要な Markdown 要素の保護（コード・数式・リンク → プレースホルダー）
 # ----------------------------------------
-STRING_LITERAL_RE = re.compile(r"(?P<quote>['\"]{1,3})(?P<content>.*?)(?P=quote)", re.DOTALL)
+MARKDOWN_PROTECT_RE = re.compile(
+    r"```.*?```"                            # コードフェンス
+    r"|`[^`\n]+`"                           # インラインコード
+    r"|\$\$.+?\$\$"                         # ディスプレイ数式
+    r"|\$[^\s$](?:[^$\n]*[^\s$])?\$(?!\d)"  # インライン数式（pandoc と同様、金額の $5 などは対象外）
+    r"|!?\[[^\]\n]*\]\([^)\n]*\)",          # 画像・リンク
+    re.DOTALL,
+)
+# 私用領域の文字は翻訳エンジンに変更されないため、プレースホルダーの区切りに使う
+PLACEHOLDER_RE = re.compile(r"\uE000\s*(\d+)\s*\uE001")
+
+def protect_markdown(text: str) -> tuple[str, tuple[str, ...]]:
+    """翻訳不要な要素をプレースホルダーに置き換え、(置換後のテキスト, 元の要素) を返す"""
+    protected: list[str] = []
+
+    def replacer(match: re.Match) -> str:
+        protected.append(match.group(0))
+        return f"\uE000{len(protected) - 1}\uE001"
+
+    return MARKDOWN_PROTECT_RE.sub(replacer, text), tuple(protected)
+
+def restore_markdown(text: str, protected: tuple[str, ...]) -> Optional[str]:
+    """プレースホルダーを元の要素に戻す。翻訳でプレースホルダーが欠けた場合は None を返す"""
+    restored: set[int] = set()
+
+    def replacer(match: re.Match) -> str:
+        index = int(match.group(1))
+        if index >= len(protected):
+            return match.group(0)
+        restored.add(index)
+        return protected[index]
+
+    result = PLACEHOLDER_RE.sub(replacer, text)
+    if len(restored) != len(protected):
+        return None
+    return result
+
+def has_translatable_text(protected_text: str) -> bool:
+    """プレースホルダー以外に翻訳すべきテキストが残っているかどうか"""
+    return bool(PLACEHOLDER_RE.sub('', protected_text).strip())
+
+# 定型文のMarkdownは複数のセル・Notebookに繰り返し現れ、ディレクトリ処理では2回ずつ参照されるため結果をキャッシュする
+@lru_cache(maxsize=8192)
+def prepare_markdown(text: str) -> Optional[tuple[str, tuple[str, ...]]]:
+    """
+    Markdownを翻訳エンジンに渡す形に変換し、(保護済みテキスト, 保護した要素) を返す。
+    翻訳する必要がない場合は None を返す。
+    """
+    if is_trivial_markdown(text):
+        return None
+    protected_text, protected = protect_markdown(text)
+    if not has_translatable_text(protected_text):
+        return None
+    return protected_text, protected
+
+def translate_texts(texts: list[str], translator: TranslatorInterface) -> list[Optional[str]]:
+    """テキストのリストをチャンク単位でバッチ翻訳し、入力と同じ順序で返す（失敗した要素は None）"""
+    translated: list[Optional[str]] = []
+    for chunk in chunk_texts(texts):
+        translated.extend(translator.translate_batch(chunk))
+    return translated
+
+# ----------------------------------------
+# コードセル内の文字列リテラル翻訳（tokenize ベース）
+# ----------------------------------------
+STRING_PREFIX_RE = re.compile(r"(?P<prefix>[A-Za-z]*)(?P<quote>'''|\"\"\"|'|\")")
+
+def _format_string_literal(prefix: str, quote: str, value: str, newline: str = '\n') -> str:
+    """
+    翻訳後の文字列を、元のリテラルと同じプレフィックス・引用符でエスケープして組み立てる。
+    三重引用符のリテラル内の改行は newline（元のリテラルの改行コード）で出力する。
+    """
+    body = value.replace('\\', '\\\\').replace(quote[0], '\\' + quote[0])
+    if len(quote) == 1:
+        body = body.replace('\n', '\\n').replace('\r', '\\r')
+    elif newline != '\n':
+        body = body.replace('\n', newline)
+    return f"{prefix}{quote}{body}{quote}"
 
-def translate_code_cell_source(source: list[str], translator: TranslatorInterface, min_length: int = 20) -> list[str]:
+def find_string_literals(code_text: str, min_length: int = 20) -> tuple[tuple[int, int, str, str, str], ...]:
+    """
+    コードから翻訳対象の文字列リテラルを検出し、
+    (開始位置, 終了位置, プレフィックス, 引用符, 値) のタプルを返す。
+    raw・bytes・f-string と min_length文字未満のものは対象外。
+    """
+    # import文や短い式だけのセルは、引用符を含めても min_length文字のリテラルを持ち得ないので字句解析しない
+    if len(code_text) < min_length + 2 or ('"' not in code_text and "'" not in code_text):
+        return ()
+    # %%bash などのセルマジックは、セル全体が Python ではない
+    if code_text.lstrip().startswith('%%'):
+        return ()
+    return _tokenize_string_literals(code_text, min_length)
+
+# ディレクトリ処理では同じコードセルを2回解析するため、結果をキャッシュする
+@lru_cache(maxsize=8192)
+def _tokenize_string_literals(code_text: str, min_length: int) -> tuple[tuple[int, int, str, str, str], ...]:
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(code_text).readline))
+    except (tokenize.TokenError, SyntaxError) as e:
+        # マジックコマンドなど Python として字句解析できないセルは翻訳しない
+        logger.debug(f"[code] Skipped cell that could not be tokenized: {e}")
+        return ()
+
+    # tokenize の (行, 列) を code_text 内のオフセットに変換するための各行の開始位置
+    # IPython のマジック（%）・シェルコマンド（!）の行にある文字列は Python の文字列ではないので除く
+    line_starts = [0, 0]
+    magic_lines: set[int] = set()
+    for lineno, line in enumerate(io.StringIO(code_text), start=1):
+        line_starts.append(line_starts[-1] + len(line))
+        if line.lstrip().startswith(('%', '!')):
+            magic_lines.add(lineno)
+
+    literals: list[tuple[int, int, str, str, str]] = []
+    for tok in tokens:
+        if tok.type != token.STRING or tok.start[0] in magic_lines:
+            continue
+        match = STRING_PREFIX_RE.match(tok.string)
+        if not match or set(match.group("prefix").lower()) & set("rbf"):
+            continue
+        try:
+            value = ast.literal_eval(tok.string)
+        except (ValueError, SyntaxError):
+            continue
+        if isinstance(value, str) and len(value) >= min_length and value.strip():
+            start = line_starts[tok.start[0]] + tok.start[1]
+            end = line_starts[tok.end[0]] + tok.end[1]
+            literals.append((start, end, match.group("prefix"), match.group("quote"), value))
+
+    return tuple(literals)
+
+def translate_code_cell_source(source: list[str], translator: TranslatorInterface, min_length: int = 20) -> tuple[list[str], bool, bool]:
     """
     コードセルのソースから文字列リテラルを検出し、
-    20文字以上の場合に翻訳する。
+    min_length文字以上の場合に翻訳する。
+    (新しいソース, 変更があったかどうか, 対象のリテラルをすべて翻訳できたかどうか) を返す。
     """
     code_text = "".join(source)
-    
-    def replacer(match: re.Match) -> str:
-        quote = match.group("quote")
-        content = match.group("content")
-        if len(content) >= min_length:
-            translated = translator.translate(content)
-            logger.debug(f"[code] Translated literal: {content[:20]}... -> {translated[:20]}...")
-            return f"{quote}{translated}{quote}"
+    literals = find_string_literals(code_text, min_length)
+    if not literals:
+        return source, False, True
+
+    translated_values = translate_texts([value for *_, value in literals], translator)
+
+    pieces: list[str] = []
+    position = 0
+    changed = False
+    complete = True
+    for (start, end, prefix, quote, value), translated in zip(literals, translated_values):
+        pieces.append(code_text[position:start])
+        if translated is None:
+            complete = False
+            pieces.append(code_text[start:end])
+        elif translated != value:
+            changed = True
+            logger.debug(f"[code] Translated literal: {value[:20]}... -> {translated[:20]}...")
+            newline = '\r\n' if '\r\n' in code_text[start:end] else '\n'
+            pieces.append(_format_string_literal(prefix, quote, translated, newline))
         else:
-            return match.group(0)
-    
-    new_code_text = STRING_LITERAL_RE.sub(replacer, code_text)
-    return new_code_text.splitlines(keepends=True)
+            pieces.append(code_text[start:end])
+        position = end
+    if not changed:
+        return source, False, complete
+    pieces.append(code_text[position:])
+    return "".join(pieces).splitlines(keepends=True), True, complete
+
+# ----------------------------------------
+# Notebookの読み書き（orjson があれば使用）
+# ----------------------------------------
+def load_notebook(path: str) -> dict:
+    with open(path, 'rb') as f:
+        if orjson is not None:
+            # 出力に大きな画像などを含むNotebookでも、mmap で読み込み用のコピーを作らずに解析する
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                return orjson.loads(view)
+        return json.loads(f.read())
+
+def save_notebook(notebook: dict, path: str, pretty: bool = False, compress: bool = False) -> None:
+    """
+    Notebookを書き出す。出力は機械が読むものなので既定ではインデントしない（pretty=True でインデント付き）。
+    compress=True の場合は gzip（SSDの書き込み速度に見合う圧縮レベル1）で圧縮する。
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        data = orjson.dumps(notebook, option=option)
+    elif pretty:
+        data = json.dumps(notebook, ensure_ascii=False, indent=2).encode('utf-8')
+    else:
+        data = json.dumps(notebook, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    # 書き込み途中で失敗しても出力が壊れないよう、一時ファイルに書いてから置き換える
+    tmp_path = path + '.tmp'
+    try:
+        if compress:
+            with gzip.open(tmp_path, 'wb', compresslevel=1) as f:
+                f.write(data)
+        else:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# ----------------------------------------
+# 原文ハッシュ（前回の実行から変更が無ければ翻訳をスキップ）
+# ----------------------------------------
+SOURCE_HASH_SUFFIX = '.srchash'
+
+def compute_source_hash(notebook: dict, translate_code: bool = False) -> str:
+    """翻訳対象となるセルのソースからハッシュを計算する"""
+    h = hashlib.blake2b(b'code' if translate_code else b'markdown')
+    for cell in notebook.get('cells', []):
+        cell_type = cell.get('cell_type')
+        if cell_type == 'markdown' or (cell_type == 'code' and translate_code):
+            h.update(b"\0")
+            h.update(''.join(cell.get('source', [])).encode('utf-8'))
+    return h.hexdigest()
+
+def read_source_hash(output_path: str) -> Optional[str]:
+    try:
+        with open(output_path + SOURCE_HASH_SUFFIX, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def write_source_hash(output_path: str, src_hash: str) -> None:
+    with open(output_path + SOURCE_HASH_SUFFIX, 'w', encoding='utf-8') as f:
+        f.write(src_hash)
+
+def remove_source_hash(output_path: str) -> None:
+    try:
+        os.remove(output_path + SOURCE_HASH_SUFFIX)
+    except FileNotFoundError:
+        pass
 
 # ----------------------------------------
 # Notebookのセル翻訳処理（Markdown＋オプションでコードセル）
 # ----------------------------------------
-def translate_notebook_cells(input_path: str, translator: TranslatorInterface, translate_code: bool = False, output_path: Optional[str] = None) -> None:
-    logger.info(f"Loading notebook: {input_path}")
+def open_notebook_for_translation(input_path: str, translate_code: bool = False, output_path: Optional[str] = None, compress: bool = False) -> Optional[tuple[dict, str, str]]:
+    """
+    Notebookを読み込み、(notebook, 出力パス, 原文ハッシュ) を返す。
+    読み込みに失敗した場合や、前回の実行から原文が変わっていない場合は None を返す。
+    """
     try:
-        with open(input_path, 'r', encoding='utf-8') as f:
-            notebook = json.load(f)
+        notebook = load_notebook(input_path)
     except Exception as e:
         logger.error(f"Failed to read notebook: {e}")
+        return None
+
+    if not output_path:
+        dirname, filename = os.path.split(input_path)
+        output_path = os.path.join(dirname, f"{OUTPUT_PREFIX}{filename}")
+    if compress and not output_path.endswith('.gz'):
+        output_path += '.gz'
+
+    src_hash = compute_source_hash(notebook, translate_code)
+    if os.path.exists(output_path) and read_source_hash(output_path) == src_hash:
+        logger.info(f"Source unchanged since last run, skipping: {input_path}")
+        return None
+    return notebook, output_path, src_hash
+
+def collect_markdown_cells(cells: list[dict]) -> list[tuple[int, str, tuple[str, ...]]]:
+    """翻訳対象のMarkdownセルを (インデックス, 保護済みテキスト, 保護した要素) のリストで返す"""
+    markdown_cells: list[tuple[int, str, tuple[str, ...]]] = []
+    for index, cell in enumerate(cells):
+        if cell.get('cell_type') == 'markdown':
+            prepared = prepare_markdown(''.join(cell.get('source', [])))
+            if prepared is not None:
+                markdown_cells.append((index, *prepared))
+    return markdown_cells
+
+def collect_notebook_texts(input_path: str, translate_code: bool = False, compress: bool = False) -> Optional[list[str]]:
+    """
+    Notebookから翻訳エンジンに渡すテキストを集める。
+    translate_notebook_cells がスキップするNotebookでは None を返す。
+    """
+    opened = open_notebook_for_translation(input_path, translate_code, compress=compress)
+    if opened is None:
+        return None
+    notebook, _, _ = opened
+    cells = notebook.get('cells', [])
+    texts = [text for _, text, _ in collect_markdown_cells(cells)]
+    if translate_code:
+        for cell in cells:
+            if cell.get('cell_type') == 'code':
+                literals = find_string_literals(''.join(cell.get('source', [])), min_length=20)
+                texts.extend(value for *_, value in literals)
+    return texts
+
+def translate_notebook_cells(input_path: str, translator: TranslatorInterface, translate_code: bool = False, output_path: Optional[str] = None,
+                             pretty: bool = False, compress: bool = False) -> None:
+    logger.info(f"Loading notebook: {input_path}")
+    opened = open_notebook_for_translation(input_path, translate_code, output_path, compress)
+    if opened is None:
         return
+    notebook, output_path, src_hash = opened
 
     translated_any = False
-    for cell in notebook.get('cells', []):
-        cell_type = cell.get('cell_type')
-        if cell_type == 'markdown':
-            original_text = ''.join(cell.get('source', []))
-            translated_text = translator.translate(original_text)
-            if translated_text != original_text:
-                translated_any = True
-                cell['source'] = [translated_text]
-        elif cell_type == 'code' and translate_code:
-            original_source = cell.get('source', [])
-            new_source = translate_code_cell_source(original_source, translator, min_length=20)
-            if "".join(new_source) != "".join(original_source):
+    # 翻訳に失敗したセルが残る場合は原文ハッシュを保存せず、次回の実行で再翻訳する
+    complete = True
+    cells = notebook.get('cells', [])
+
+    # Markdownセルはまとめてバッチ翻訳し、結果をインデックスで書き戻す
+    markdown_cells = collect_markdown_cells(cells)
+    translated_texts = translate_texts([text for _, text, _ in markdown_cells], translator)
+    for (index, protected_text, protected), translated_text in zip(markdown_cells, translated_texts):
+        if translated_text is None:
+            complete = False
+            continue
+        if translated_text == protected_text:
+            continue
+        restored_text = restore_markdown(translated_text, protected)
+        if restored_text is None:
+            logger.warning(f"Placeholders were lost in translation, keeping original cell {index} of {input_path}")
+            complete = False
+            continue
+        translated_any = True
+        cells[index]['source'] = [restored_text]
+
+    for cell in cells:
+        if cell.get('cell_type') == 'code' and translate_code:
+            new_source, changed, cell_complete = translate_code_cell_source(cell.get('source', []), translator, min_length=20)
+            complete = complete and cell_complete
+            if changed:
                 translated_any = True
                 cell['source'] = new_source
 
-    if not output_path:
-        dirname, filename = os.path.split(input_path)
-        output_path = os.path.join(dirname, f"jp_{filename}")
-
     if translated_any:
         try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(notebook, f, ensure_ascii=False, indent=2)
+            save_notebook(notebook, output_path, pretty, compress)
+            if complete:
+                write_source_hash(output_path, src_hash)
+            else:
+                remove_source_hash(output_path)
+                logger.warning(f"Some cells were not translated, will retry on next run: {input_path}")
             logger.info(f"Saved translated notebook: {output_path}")
         except Exception as e:
             logger.error(f"Failed to save translated notebook: {e}")
     else:
+        remove_source_hash(output_path)
         logger.info(f"No cells were translated in {input_path}")
 
-def translate_notebooks_in_directory(directory: str, translator: TranslatorInterface, translate_code: bool = False) -> None:
+def iter_notebook_paths(directory: str) -> Iterator[str]:
+    """ディレクトリ内の翻訳対象Notebookのパスを返す（過去の翻訳結果は除く）"""
+    with os.scandir(directory) as it:
+        for entry in it:
+            if (entry.is_file(follow_symlinks=False) and entry.name.endswith('.ipynb')
+                    and not entry.name.startswith(TRANSLATED_PREFIXES)):
+                yield entry.path
+
+def translate_notebooks_in_directory(directory: str, translator: TranslatorInterface, translate_code: bool = False, workers: int = 16,
+                                     pretty: bool = False, compress: bool = False) -> None:
     if not os.path.isdir(directory):
         logger.error(f"Directory not found: {directory}")
         return
 
     logger.info(f"Translating notebooks in directory: {directory}")
-    for filename in os.listdir(directory):
-        if filename.endswith('.ipynb'):
-            input_path = os.path.join(directory, filename)
-            translate_notebook_cells(input_path, translator, translate_code)
+
+    # 各ファイルは独立しており待ち時間の大半はネットワークI/Oなので、スレッドで並列に処理する
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # 1回目: 全Notebookから翻訳対象のテキストを集め、重複を除いてからまとめて翻訳する
+        input_paths: list[str] = []
+        unique_texts: dict[str, None] = {}
+        candidates = list(iter_notebook_paths(directory))
+        for input_path, texts in zip(candidates, executor.map(lambda path: collect_notebook_texts(path, translate_code, compress), candidates)):
+            if texts is not None:
+                input_paths.append(input_path)
+                unique_texts.update(dict.fromkeys(texts))
+
+        # バッチ翻訳できるエンジンは API の上限に合わせてまとめ、それ以外は1件ずつワーカーに分散する
+        if translator.supports_batch:
+            chunks = list(chunk_texts(list(unique_texts)))
+        else:
+            chunks = [[text] for text in unique_texts]
+        translations: dict[str, Optional[str]] = {}
+        for chunk, translated in zip(chunks, executor.map(translator.translate_batch, chunks)):
+            translations.update(zip(chunk, translated))
+        logger.info(f"Translated {len(translations)} unique texts from {len(input_paths)} notebooks")
+
+        # 2回目: 翻訳結果を引きながら各Notebookに書き戻す
+        lookup = LookupTranslator(translations, translator)
+        list(executor.map(lambda input_path: translate_notebook_cells(input_path, lookup, translate_code, pretty=pretty, compress=compress), input_paths))
 
 # ----------------------------------------
 # Typer CLI エントリポイント
@@ -207,18 +905,28 @@ app = typer.Typer()
 @app.command()
 def main(
     directory: str = typer.Option(..., help="対象となるディレクトリのパス（.ipynbファイルを含む）"),
-    engine: str = typer.Option('googletrans', help="翻訳エンジン ('googletrans' または 'gcloud')"),
-    translate_code: bool = typer.Option(False, help="コードセル内の文字列リテラル（20文字以上）も翻訳する場合は True")
+    engine: str = typer.Option('googletrans', help="翻訳エンジン ('googletrans', 'gcloud' または 'gcloud-async')"),
+    translate_code: bool = typer.Option(False, help="コードセル内の文字列リテラル（20文字以上）も翻訳する場合は True"),
+    workers: int = typer.Option(16, help="並列に処理するファイル数（スレッド数）"),
+    cache: bool = typer.Option(True, help=f"翻訳結果をキャッシュする ({CACHE_PATH})"),
+    pretty: bool = typer.Option(False, help="出力するNotebookのJSONをインデントする（デバッグ用）"),
+    gzip_output: bool = typer.Option(False, "--gzip", help="出力を gzip で圧縮し .ipynb.gz として保存する")
 ) -> None:
     """
     指定したディレクトリ内のJupyter NotebookのMarkdownセルを日本語に翻訳します。
     オプションで、コードセル内の文字列リテラル（20文字以上）の翻訳も可能です。
     """
-    allowed_engines = ['googletrans', 'gcloud']
+    allowed_engines = ['googletrans', 'gcloud', 'gcloud-async']
     if engine not in allowed_engines:
         raise typer.BadParameter(f"Engine must be one of {allowed_engines}")
-    translator = get_translator(engine)
-    translate_notebooks_in_directory(directory, translator, translate_code)
+    translation_cache = TranslationCache() if cache else None
+    translator = get_translator(engine, translation_cache)
+    try:
+        translate_notebooks_in_directory(directory, translator, translate_code, workers, pretty, gzip_output)
+    finally:
+        translator.close()
+        if translation_cache is not None:
+            translation_cache.close()
 
 if __name__ == "__main__":
     app()